@@ -36,6 +36,9 @@ TABLE_SUFFIX_SEPARATOR = '__'
 _BQ_DELETE_TABLE_COMMAND = 'bq rm -f -t {FULL_TABLE_ID}'
 _GCS_DELETE_FILES_COMMAND = 'gsutil -m rm -f -R {ROOT_PATH}'
 BQ_NUM_RETRIES = 5
+# Matches table references in the format of PROJECT:DATASET.TABLE.
+_TABLE_REFERENCE_RE = re.compile(
+    r'^((?P<project>.+):)(?P<dataset>\w+)\.(?P<table>[\w\$]+)$')
 
 
 class ColumnKeyConstants():
@@ -140,8 +143,7 @@ def parse_table_reference(input_table):
   Returns:
     A tuple (PROJECT, DATASET, TABLE).
   """
-  table_re_match = re.match(
-      r'^((?P<project>.+):)(?P<dataset>\w+)\.(?P<table>[\w\$]+)$', input_table)
+  table_re_match = _TABLE_REFERENCE_RE.match(input_table)
   if not table_re_match:
     raise ValueError('Expected a table reference (PROJECT:DATASET.TABLE), '
                      'got {}'.format(input_table))
@@ -282,9 +284,7 @@ def update_bigquery_schema_on_append(schema_fields, output_table):
   If table does not exist, do not need to update the schema.
   TODO (yifangchen): Move the logic into validate().
   """
-  output_table_re_match = re.match(
-      r'^((?P<project>.+):)(?P<dataset>\w+)\.(?P<table>[\w\$]+)$',
-      output_table)
+  output_table_re_match = _TABLE_REFERENCE_RE.match(output_table)
   credentials = GoogleCredentials.get_application_default().create_scoped(
       ['https://www.googleapis.com/auth/bigquery'])
   client = beam_bigquery.BigqueryV2(credentials=credentials)
@@ -15,24 +15,55 @@
 """Implements a variant merge stategy that moves fields to calls."""
 
 
-import hashlib
 import re
-from typing import Iterable, Set  # pylint: disable=unused-import
+import struct
+from typing import Any, Callable, Dict, Iterable, List, Set  # pylint: disable=unused-import
 
 from apache_beam.io.gcp.internal.clients import bigquery  # pylint: disable=unused-import
+import farmhash
 
 from gcp_variant_transforms.beam_io.vcfio import Variant
+from gcp_variant_transforms.beam_io.vcfio import VariantCall  # pylint: disable=unused-import
 from gcp_variant_transforms.libs import bigquery_util
 from gcp_variant_transforms.libs.variant_merge import variant_merge_strategy
 
 __all__ = ['MoveToCallsStrategy']
 
+# Hashes reference and alternate bases in merge keys. The hash is only used
+# to shorten the key, so a fast non-cryptographic fingerprint is sufficient.
+_get_hash = farmhash.fingerprint64
+# Hash of missing reference or alternate bases, which is common enough in
+# merge keys to be worth computing only once.
+_EMPTY_HASH = _get_hash('')
+# Packs start, end and the hashes of reference and alternate bases into the
+# fixed size part of a merge key.
+_MERGE_KEY_SUFFIX = struct.Struct('>qqQQ')
+
+
+def _split_info(info,  # type: Dict[str, Any]
+                should_move,  # type: Callable[[str], bool]
+                moved_info,  # type: Dict[str, Any]
+                remaining_info  # type: Dict[str, Any]
+               ):
+  # type: (...) -> None
+  """Splits the items of `info` into `moved_info` and `remaining_info`.
+
+  This is the innermost loop of merging, so it only works with local names.
+  """
+  for info_key, info_value in info.items():
+    if should_move(info_key):
+      moved_info[info_key] = info_value
+    else:
+      remaining_info[info_key] = info_value
+
 
 class MoveToCallsStrategy(variant_merge_strategy.VariantMergeStrategy):
   """A merging strategy that moves fields to the corresponding calls records.
 
-  Variants will be merged across files using
-  'reference_name:start:end:reference_bases:alternate_bases' as key. INFO
+  Variants will be merged across files using reference_name, start, end,
+  reference_bases and alternate_bases as key. The key is opaque bytes: the UTF-8
+  encoded reference_name followed by start, end and 64-bit fingerprints of
+  reference_bases and alternate_bases, packed with struct as '>qqQQ'. INFO
   fields would be moved to calls if they match
   `info_keys_to_move_to_calls_regex`. Otherwise, one will be chosen as
   representatve (in no particular order) among the merged variants.
@@ -58,11 +89,32 @@ class MoveToCallsStrategy(variant_merge_strategy.VariantMergeStrategy):
       copy_filter_to_calls: Whether to copy filter field to the associated calls
         in each record.
     """
+    self._info_keys_to_move_to_calls_regex = info_keys_to_move_to_calls_regex
+    self._copy_quality_to_calls = copy_quality_to_calls
+    self._copy_filter_to_calls = copy_filter_to_calls
     self._info_keys_to_move_to_calls_re = (
         re.compile(info_keys_to_move_to_calls_regex)
         if info_keys_to_move_to_calls_regex else None)
-    self._copy_quality_to_calls = copy_quality_to_calls
-    self._copy_filter_to_calls = copy_filter_to_calls
+    self._move_match = (self._info_keys_to_move_to_calls_re.match
+                        if self._info_keys_to_move_to_calls_re else None)
+    # Maps info keys to whether they should be moved to calls. The set of info
+    # keys is bounded by the VCF headers, so the cache stays small.
+    self._move_cache = {}  # type: Dict[str, bool]
+    # The last reference name seen by `get_merge_keys` and its encoding.
+    # Variants are mostly read in sorted order, so consecutive variants
+    # usually share the reference name. Kept as a single tuple so that the
+    # two values are always updated together.
+    self._last_reference_name = ('', b'')
+
+  def __getstate__(self):
+    # Only the initialization parameters are pickled. The compiled regex, its
+    # bound match method and the caches are rebuilt when unpickling on workers.
+    return (self._info_keys_to_move_to_calls_regex,
+            self._copy_quality_to_calls,
+            self._copy_filter_to_calls)
+
+  def __setstate__(self, state):
+    self.__init__(*state)
 
   def move_data_to_calls(self, variant):
     # type: (Variant) -> None
@@ -73,18 +125,14 @@ class MoveToCallsStrategy(variant_merge_strategy.VariantMergeStrategy):
       variant: The variant whose filters, quality, and info items will be moved
         to its calls if specified.
     """
-    additional_call_info = {}
-    if self._should_copy_filter_to_calls():
-      additional_call_info[
-          bigquery_util.ColumnKeyConstants.FILTER] = variant.filters
-    if self._should_copy_quality_to_calls():
-      additional_call_info[
-          bigquery_util.ColumnKeyConstants.QUALITY] = variant.quality
-    for info_key, info_value in variant.info.items():
-      if self._should_move_info_key_to_calls(info_key):
-        additional_call_info[info_key] = info_value
-    for call in variant.calls:
-      call.info.update(additional_call_info)
+    additional_call_info = self._get_copied_call_info(variant)
+    # Without the regex no info item is moved, so the info loop is skipped.
+    if self._move_match is not None:
+      should_move = self._should_move_info_key_to_calls
+      for info_key, info_value in variant.info.items():
+        if should_move(info_key):
+          additional_call_info[info_key] = info_value
+    self._add_info_to_calls(variant.calls, additional_call_info)
 
   def move_data_to_merged(self, variant, merged_variant):
     # type: (Variant, Variant) -> None
@@ -96,15 +144,21 @@ class MoveToCallsStrategy(variant_merge_strategy.VariantMergeStrategy):
       merged_variant: The variant who will receive the info items of `variant`
         if specified.
     """
+    should_move = self._should_move_info_key_to_calls
+    merged_info = merged_variant.info
     for info_key, info_value in variant.info.items():
-      if not self._should_move_info_key_to_calls(info_key):
-        merged_variant.info[info_key] = info_value
+      if not should_move(info_key):
+        merged_info[info_key] = info_value
 
   def get_merged_variants(self, variants, unused_key=None):
-    # type: (List[Variant], str) -> List[Variant]
+    # type: (List[Variant], bytes) -> List[Variant]
     if not variants:
       return []
     merged_variant = None
+    # Names and filters are deduplicated as they are collected.
+    names = set()
+    filters = set()
+    should_move = self._should_move_info_key_to_calls
     for variant in variants:
       if not merged_variant:
         merged_variant = Variant(reference_name=variant.reference_name,
@@ -123,85 +177,123 @@ class MoveToCallsStrategy(variant_merge_strategy.VariantMergeStrategy):
           'Cannot merge variants with different alternate bases. {} vs {}'
           .format(variant.alternate_bases, merged_variant.alternate_bases))
 
-      merged_variant.names.extend(variant.names)
-      merged_variant.filters.extend(variant.filters)
+      names.update(variant.names)
+      filters.update(variant.filters)
       if (merged_variant.quality is not None and
           variant.quality is not None):
         merged_variant.quality = max(merged_variant.quality, variant.quality)
       elif merged_variant.quality is None:
         merged_variant.quality = variant.quality
 
-      self.move_data_to_calls(variant)
-      self.move_data_to_merged(variant, merged_variant)
+      # Equivalent to calling `move_data_to_calls` and `move_data_to_merged`,
+      # but iterates over the info items only once.
+      additional_call_info = self._get_copied_call_info(variant)
+      if self._move_match is None:
+        merged_variant.info.update(variant.info)
+      else:
+        _split_info(variant.info, should_move, additional_call_info,
+                    merged_variant.info)
+      self._add_info_to_calls(variant.calls, additional_call_info)
 
       merged_variant.calls.extend(variant.calls)
 
-    # Deduplicate names and filters.
-    merged_variant.names = sorted(set(merged_variant.names))
-    merged_variant.filters = sorted(set(merged_variant.filters))
+    merged_variant.names = sorted(names)
+    merged_variant.filters = sorted(filters)
     return [merged_variant]
 
   def get_merge_keys(self, variant):
-    yield ':'.join(
-        [str(x) for x in [
-            variant.reference_name or '',
-            variant.start or '',
-            variant.end or '',
-            self._get_hash(variant.reference_bases or ''),
-            self._get_hash(','.join(variant.alternate_bases or []))]])
+    # type: (Variant) -> Iterable[bytes]
+    reference_bases_hash = (_get_hash(variant.reference_bases)
+                            if variant.reference_bases else _EMPTY_HASH)
+    alternate_bases_hash = (_get_hash(','.join(variant.alternate_bases))
+                            if variant.alternate_bases else _EMPTY_HASH)
+    reference_name = variant.reference_name or ''
+    last_reference_name, encoded_reference_name = self._last_reference_name
+    if reference_name != last_reference_name:
+      encoded_reference_name = reference_name.encode('utf-8')
+      self._last_reference_name = (reference_name, encoded_reference_name)
+    # The key is opaque and only used for grouping, so it is packed as bytes:
+    # the encoded reference name followed by a fixed size suffix. As the
+    # suffix has a fixed size, keys of different variants cannot collide even
+    # though the reference name has a variable length.
+    yield encoded_reference_name + (
+        _MERGE_KEY_SUFFIX.pack(variant.start or 0,
+                               variant.end or 0,
+                               reference_bases_hash,
+                               alternate_bases_hash))
 
   def modify_bigquery_schema(self, schema, info_keys):
     # type: (bigquery.TableSchema, Set[str]) -> None
     # Find the calls record so that it's easier to reference it below.
-    calls_record = None
-    for field in schema.fields:
-      if field.name == bigquery_util.ColumnKeyConstants.CALLS:
-        calls_record = field
-        break
+    fields_by_name = {field.name: field for field in schema.fields}
+    calls_record = fields_by_name.get(bigquery_util.ColumnKeyConstants.CALLS)
     if not calls_record:
       raise ValueError('calls record must exist in the schema.')
 
     existing_calls_keys = {field.name for field in calls_record.fields}
     updated_fields = []
+    # Bind the loop invariants to locals, as this is called for every field.
+    copy_filter = self._copy_filter_to_calls
+    copy_quality = self._copy_quality_to_calls
+    should_move = self._should_move_info_key_to_calls
+    filter_key = bigquery_util.ColumnKeyConstants.FILTER
+    quality_key = bigquery_util.ColumnKeyConstants.QUALITY
+    append_to_updated = updated_fields.append
+
+    def append_to_calls(field):
+      # Keeps `existing_calls_keys` in sync with the calls record.
+      calls_record.fields.append(field)
+      existing_calls_keys.add(field.name)
+
     for field in schema.fields:
-      if (self._should_copy_filter_to_calls() and
-          field.name == bigquery_util.ColumnKeyConstants.FILTER):
-        if bigquery_util.ColumnKeyConstants.FILTER in existing_calls_keys:
-          self._raise_duplicate_key_error(
-              bigquery_util.ColumnKeyConstants.FILTER,
-              'should_copy_filter_to_calls')
-        calls_record.fields.append(field)
-        updated_fields.append(field)
-      elif (self._should_copy_quality_to_calls() and
-            field.name == bigquery_util.ColumnKeyConstants.QUALITY):
-        if bigquery_util.ColumnKeyConstants.QUALITY in existing_calls_keys:
-          self._raise_duplicate_key_error(
-              bigquery_util.ColumnKeyConstants.QUALITY,
-              'should_copy_quality_to_calls')
-        calls_record.fields.append(field)
-        updated_fields.append(field)
-      elif (field.name in info_keys and
-            self._should_move_info_key_to_calls(field.name)):
+      if copy_filter and field.name == filter_key:
+        if filter_key in existing_calls_keys:
+          self._raise_duplicate_key_error(filter_key,
+                                          'should_copy_filter_to_calls')
+        append_to_calls(field)
+        append_to_updated(field)
+      elif copy_quality and field.name == quality_key:
+        if quality_key in existing_calls_keys:
+          self._raise_duplicate_key_error(quality_key,
+                                          'should_copy_quality_to_calls')
+        append_to_calls(field)
+        append_to_updated(field)
+      elif field.name in info_keys and should_move(field.name):
         if field.name in existing_calls_keys:
           self._raise_duplicate_key_error(field.name,
                                           'info_keys_to_move_to_calls_regex')
-        calls_record.fields.append(field)
+        append_to_calls(field)
       else:
-        updated_fields.append(field)
+        append_to_updated(field)
     schema.fields = updated_fields
 
-  def _get_hash(self, value):
-    return hashlib.md5(value.encode('utf-8')).hexdigest()
-
-  def _should_move_info_key_to_calls(self, info_key):
-    return bool(self._info_keys_to_move_to_calls_re and
-                self._info_keys_to_move_to_calls_re.match(info_key))
+  def _get_copied_call_info(self, variant):
+    # type: (Variant) -> Dict[str, Any]
+    """Returns the variant-level fields that should be copied to its calls."""
+    copied_call_info = {}
+    if self._copy_filter_to_calls:
+      copied_call_info[
+          bigquery_util.ColumnKeyConstants.FILTER] = variant.filters
+    if self._copy_quality_to_calls:
+      copied_call_info[
+          bigquery_util.ColumnKeyConstants.QUALITY] = variant.quality
+    return copied_call_info
 
-  def _should_copy_filter_to_calls(self):
-    return self._copy_filter_to_calls
+  def _add_info_to_calls(self, calls, additional_call_info):
+    # type: (List[VariantCall], Dict[str, Any]) -> None
+    """Adds `additional_call_info` to the info of each call."""
+    if not additional_call_info:
+      return
+    for call in calls:
+      call.info.update(additional_call_info)
 
-  def _should_copy_quality_to_calls(self):
-    return self._copy_quality_to_calls
+  def _should_move_info_key_to_calls(self, info_key):
+    should_move = self._move_cache.get(info_key)
+    if should_move is None:
+      should_move = (self._move_match is not None and
+                     self._move_match(info_key) is not None)
+      self._move_cache[info_key] = should_move
+    return should_move
 
   def _raise_duplicate_key_error(self, key, flag_name):
     raise ValueError(
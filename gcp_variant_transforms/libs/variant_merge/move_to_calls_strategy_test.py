@@ -15,6 +15,7 @@
 """Tests for move_to_calls_strategy."""
 
 
+import pickle
 import unittest
 
 from apache_beam.io.gcp.internal.clients import bigquery
@@ -223,37 +224,115 @@ class MoveToCallsStrategyTest(unittest.TestCase):
         merged_variant.calls)
     self.assertEqual([], list(merged_variant.info.keys()))
 
-  def test_get_merge_keys(self):
-    strategy = move_to_calls_strategy.MoveToCallsStrategy(None, None, None)
+  def test_move_data_to_calls(self):
+    variant = self._get_sample_variants()[0]
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(
+        info_keys_to_move_to_calls_regex=None,
+        copy_quality_to_calls=True,
+        copy_filter_to_calls=False)
+    strategy.move_data_to_calls(variant)
+    self.assertEqual(
+        [vcfio.VariantCall(sample_id=hash_name('Sample1'), genotype=[0, 1],
+                           info={'GQ': 20, 'HQ': [10, 20],
+                                 ColumnKeyConstants.QUALITY: 2}),
+         vcfio.VariantCall(sample_id=hash_name('Sample2'), genotype=[1, 0],
+                           info={'GQ': 10, 'FLAG1': True,
+                                 ColumnKeyConstants.QUALITY: 2})],
+        variant.calls)
 
-    def get_expected_key(reference_name, start, end,
-                         reference_bases, alternate_bases):
-      return '%s:%s:%s:%s:%s'%(
-          reference_name or '',
-          str(start or ''),
-          str(end or ''),
-          strategy._get_hash(reference_bases or ''),
-          strategy._get_hash(','.join(alternate_bases or [])))
+    variant = self._get_sample_variants()[0]
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(
+        info_keys_to_move_to_calls_regex='^A1$',
+        copy_quality_to_calls=True,
+        copy_filter_to_calls=False)
+    strategy.move_data_to_calls(variant)
+    self.assertEqual(
+        [vcfio.VariantCall(sample_id=hash_name('Sample1'), genotype=[0, 1],
+                           info={'GQ': 20, 'HQ': [10, 20], 'A1': 'some data',
+                                 ColumnKeyConstants.QUALITY: 2}),
+         vcfio.VariantCall(sample_id=hash_name('Sample2'), genotype=[1, 0],
+                           info={'GQ': 10, 'FLAG1': True, 'A1': 'some data',
+                                 ColumnKeyConstants.QUALITY: 2})],
+        variant.calls)
 
-    variant = vcfio.Variant()
-    self.assertEqual(get_expected_key(None, None, None, None, None),
-                     next(strategy.get_merge_keys(variant)))
+  def test_move_data_to_calls_nothing_to_move(self):
+    variant = self._get_sample_variants()[0]
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(
+        info_keys_to_move_to_calls_regex='^B1$',
+        copy_quality_to_calls=False,
+        copy_filter_to_calls=False)
 
-    variant.reference_name = '19'
-    self.assertEqual(get_expected_key(19, None, None, None, None),
-                     next(strategy.get_merge_keys(variant)))
+    class _NoUpdateDict(dict):
 
+      def update(self, *args, **kwargs):
+        raise AssertionError('Call info should not be updated.')
 
-    variant.start = 123
-    variant.end = 125
-    variant.reference_bases = 'AT'
-    self.assertEqual(get_expected_key(19, 123, 125, 'AT', None),
-                     next(strategy.get_merge_keys(variant)))
+    for call in variant.calls:
+      call.info = _NoUpdateDict(call.info)
+    strategy.move_data_to_calls(variant)
+    self.assertEqual([{'GQ': 20, 'HQ': [10, 20]}, {'GQ': 10, 'FLAG1': True}],
+                     [call.info for call in variant.calls])
 
+  def test_pickle(self):
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(
+        info_keys_to_move_to_calls_regex='^A1$',
+        copy_quality_to_calls=True,
+        copy_filter_to_calls=False)
+    unpickled_strategy = pickle.loads(pickle.dumps(strategy))
+    variants = self._get_sample_variants()
+    expected_variants = self._get_sample_variants()
+    self.assertEqual(strategy.get_merged_variants(expected_variants),
+                     unpickled_strategy.get_merged_variants(variants))
 
-    variant.alternate_bases = ['A', 'C']
-    self.assertEqual(get_expected_key(19, 123, 125, 'AT', ['A', 'C']),
-                     next(strategy.get_merge_keys(variant)))
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(
+        info_keys_to_move_to_calls_regex=None,
+        copy_quality_to_calls=True,
+        copy_filter_to_calls=False)
+    unpickled_strategy = pickle.loads(pickle.dumps(strategy))
+    variant = self._get_sample_variants()[0]
+    expected_variant = self._get_sample_variants()[0]
+    strategy.move_data_to_calls(expected_variant)
+    unpickled_strategy.move_data_to_calls(variant)
+    self.assertEqual(expected_variant, variant)
+
+  def test_get_merge_keys(self):
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(None, None, None)
+
+    def get_key(**kwargs):
+      return next(strategy.get_merge_keys(vcfio.Variant(**kwargs)))
+
+    base = dict(reference_name='19', start=123, end=125, reference_bases='AT',
+                alternate_bases=['A', 'C'])
+    key = get_key(**base)
+    self.assertEqual(len('19') + 32, len(key))
+    self.assertTrue(key.startswith(b'19'))
+    self.assertEqual(len('chr19') + 32,
+                     len(get_key(**dict(base, reference_name='chr19'))))
+    self.assertEqual(key, get_key(**base))
+
+    # Missing and empty bases produce the same key.
+    self.assertEqual(get_key(reference_name='19', start=123, end=125),
+                     get_key(reference_name='19', start=123, end=125,
+                             reference_bases='', alternate_bases=[]))
+    self.assertEqual(32, len(get_key()))
+
+    # Variants differing in a single field produce different keys.
+    for field, value in [('start', 124),
+                         ('end', 126),
+                         ('reference_bases', 'A'),
+                         ('alternate_bases', ['A']),
+                         ('alternate_bases', ['C', 'A']),
+                         ('reference_name', '20')]:
+      self.assertNotEqual(key, get_key(**dict(base, **{field: value})), field)
+
+  def test_get_merge_keys_long_reference_names(self):
+    strategy = move_to_calls_strategy.MoveToCallsStrategy(None, None, None)
+    variant_1 = vcfio.Variant(reference_name='HLA-DRB1*15:01:01:01', start=1,
+                              end=2, reference_bases='A', alternate_bases=['C'])
+    variant_2 = vcfio.Variant(reference_name='HLA-DRB1*15:01:01:02', start=1,
+                              end=2, reference_bases='A', alternate_bases=['C'])
+    self.assertNotEqual(next(strategy.get_merge_keys(variant_1)),
+                        next(strategy.get_merge_keys(variant_2)))
 
   def _get_base_schema(self, info_keys):
     schema = bigquery.TableSchema()
@@ -14,7 +14,7 @@
 
 """Variant merge strategy interface."""
 
-from typing import Iterable, Set  # pylint: disable=unused-import
+from typing import Iterable, Set, Union  # pylint: disable=unused-import
 
 from apache_beam.io.gcp.internal.clients import bigquery  # pylint: disable=unused-import
 
@@ -27,7 +27,7 @@ class VariantMergeStrategy():
   """Interface for a variant merge strategy."""
 
   def get_merged_variants(self, variants, key):
-    # type: (List[vcfio.Variant], str) -> List[vcfio.Variant]
+    # type: (List[vcfio.Variant], Union[str, bytes]) -> List[vcfio.Variant]
     """Returns a list of merged variant(s) from the provided `variants`.
 
     Args:
@@ -42,8 +42,8 @@ class VariantMergeStrategy():
     raise NotImplementedError
 
   def get_merge_keys(self, variant):
-    # type: (vcfio.Variant) -> Iterable[str]
-    """Returns a generator of keys (str) used for merging variants."""
+    # type: (vcfio.Variant) -> Iterable[Union[str, bytes]]
+    """Returns a generator of keys (str or bytes) used for merging variants."""
     raise NotImplementedError
 
   def modify_bigquery_schema(self, schema, info_keys):
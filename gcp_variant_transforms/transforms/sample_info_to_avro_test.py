@@ -20,7 +20,6 @@ from apache_beam import transforms
 from apache_beam.testing import test_pipeline
 from apache_beam.testing.util import assert_that
 from apache_beam.testing.util import equal_to
-import mock
 
 from gcp_variant_transforms.beam_io import vcf_header_io
 from gcp_variant_transforms.beam_io.vcf_parser import SampleNameEncoding
@@ -37,10 +36,14 @@ def mocked_get_now():
 
 class ConvertSampleInfoToRowTest(unittest.TestCase):
 
-  @mock.patch('gcp_variant_transforms.transforms.sample_info_to_avro.'
-              'time.time',
-              side_effect=mocked_get_now)
-  def test_convert_sample_info_to_row(self, _):
+  def setUp(self):
+    self._original_time = sample_info_to_avro.time.time
+    sample_info_to_avro.time.time = mocked_get_now
+
+  def tearDown(self):
+    sample_info_to_avro.time.time = self._original_time
+
+  def test_convert_sample_info_to_row(self):
     vcf_header_1 = vcf_header_io.VcfHeader(
         samples=SAMPLE_LINE, file_path='gs://bucket1/dir1/file1.vcf')
     vcf_header_2 = vcf_header_io.VcfHeader(
@@ -84,10 +87,7 @@ class ConvertSampleInfoToRowTest(unittest.TestCase):
     assert_that(bigquery_rows, equal_to(expected_rows))
     pipeline.run()
 
-  @mock.patch('gcp_variant_transforms.transforms.sample_info_to_avro.'
-              'time.time',
-              side_effect=mocked_get_now)
-  def test_convert_sample_info_to_row_without_file_in_hash(self, _):
+  def test_convert_sample_info_to_row_without_file_in_hash(self):
     vcf_header_1 = vcf_header_io.VcfHeader(samples=SAMPLE_LINE,
                                            file_path='file_1')
     vcf_header_2 = vcf_header_io.VcfHeader(samples=SAMPLE_LINE,
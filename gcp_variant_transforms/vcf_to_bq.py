@@ -505,6 +505,10 @@ def run(argv=None):
       move_hom_ref_calls=known_args.move_hom_ref_calls)
   if known_args.allow_malformed_records:
     variants |= 'DropMalformedRecords' >> filter_variants.FilterVariants()
+  # Variants are partitioned by reference_name (one shard per chromosome with
+  # the default config) before merging. Since variants on different reference
+  # names never merge, each shard is merged separately and no shuffle crosses
+  # shard boundaries.
   sharded_variants = variants | 'ShardVariants' >> beam.Partition(
       shard_variants.ShardVariants(sharding), sharding.get_num_shards())
   variants = []